@@ -0,0 +1,55 @@
+# sparse finite difference solver for a particle in any potential V(x) between hard walls at xMin and xMax
+import numpy as np
+from math import factorial
+from scipy import sparse
+from scipy.sparse.linalg import eigsh, LinearOperator
+from scipy.linalg import cholesky_banded, cho_solve_banded, LinAlgError
+
+# central finite difference coefficients c_0,...,c_m of h^2 d^2/dx^2, accurate to order 2m in the spacing h
+def second_derivative_coefficients(m):
+    k = np.arange(1,m+1)
+    c = np.empty(m+1)
+    c[0] = -2*np.sum(1.0/k**2)
+    c[1:] = [2*(-1)**(j+1)*factorial(m)**2/(j**2*factorial(m-j)*factorial(m+j)) for j in k]
+    return c
+
+# Hamiltonian -hbar^2/(2 mass) d^2/dx^2 + V(x) on the points x = xMin + j h, j = 1,...,nPoints, as a sparse banded
+# matrix with order/2 diagonals on each side.  psi vanishes at the walls and is continued past them as an odd function,
+# which is exact for a particle in a box and harmless when psi is already zero there
+def grid_hamiltonian(V,xMin,xMax,nPoints,order=8,mass=1.0,hbar=1.0):
+    h = (xMax - xMin)/(nPoints + 1)
+    x = xMin + h*np.arange(1,nPoints+1)
+    m = order//2
+    c = -0.5*hbar**2/(mass*h**2)*second_derivative_coefficients(m)
+    offsets = np.arange(-m,m+1)
+    diagonals = [np.full(nPoints-abs(k),c[abs(k)]) for k in offsets]
+    diagonals[m] = diagonals[m] + V(x)
+    H = sparse.diags(diagonals,offsets,shape=(nPoints,nPoints),format='csr')
+    # stencil points j-k < 0 beyond the left wall are -psi at k-j, and likewise at the right wall
+    i, k = np.nonzero(np.arange(m+1)[None,:] > np.arange(m)[:,None] + 1)
+    rows = np.concatenate([i,nPoints-1-i])
+    cols = np.concatenate([k-i-2,nPoints-1-(k-i-2)])
+    return H - sparse.csr_matrix((np.concatenate([c[k],c[k]]),(rows,cols)),shape=(nPoints,nPoints)), x
+
+# lowest nStates energies and wavefunctions (normalized so that sum psi^2 h = 1) of grid_hamiltonian, by shift-invert
+# Lanczos around sigma, by default the minimum of V, below all of the energies.  H - sigma is then positive definite
+# and is factorized once as a banded Cholesky matrix, in O(nPoints) operations; for sigma among the energies (to get the
+# states closest to sigma) a sparse LU factorization is used instead
+def grid_eigenstates(V,xMin,xMax,nPoints,nStates=10,order=8,mass=1.0,hbar=1.0,sigma=None):
+    H, x = grid_hamiltonian(V,xMin,xMax,nPoints,order,mass,hbar)
+    if sigma is None:
+        sigma = np.min(V(x))
+    m = order//2
+    # upper banded storage of H - sigma
+    banded = np.zeros((m+1,nPoints))
+    for k in range(m+1):
+        banded[m-k,k:] = H.diagonal(k)
+    banded[m] -= sigma
+    try:
+        factor = cholesky_banded(banded,check_finite=False)
+        OPinv = LinearOperator(H.shape,matvec=lambda v: cho_solve_banded((factor,False),v,check_finite=False),dtype=float)
+    except LinAlgError:
+        OPinv = None
+    E, psi = eigsh(H,k=nStates,sigma=sigma,which='LM',OPinv=OPinv)
+    idx = np.argsort(E)
+    return E[idx], psi[:,idx]/np.sqrt(x[1]-x[0]), x
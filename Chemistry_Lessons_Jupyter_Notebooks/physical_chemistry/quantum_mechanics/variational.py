@@ -0,0 +1,302 @@
+# variational engine shared by the notebooks that expand wavefunctions (or data) in a basis.
+# A basis is a dict with
+#   'values'(points), 'derivatives'(points): basis functions and their derivatives at points, shape (len(points),K)
+#   'quadrature'(): nodes and weights for integrals over the domain of the basis
+#   'kineticFactor': T_ij = kineticFactor*int g_i' g_j' (1/2 for -1/2 d^2/dx^2)
+#   optionally 'S', 'T' and 'potential'(V), analytic matrices used in place of quadrature
+#   'cache': basis values for every grid they have been evaluated on, and S, T and the factorization of S
+# A potential V is a function of the coordinate, or a dict with an analytic form and its 'function'
+import numpy as np
+from scipy.linalg import eigh, cholesky, solve_triangular, LinAlgError
+from scipy.sparse.linalg import eigsh, LinearOperator
+
+# factorization of S for solving H c = E S c: the Cholesky factor L, S = L L^T, when S is positive definite, otherwise
+# the canonical orthogonalizer X = U s^(-1/2), X^T S X = 1, without the eigenvalues of S that are zero to round-off
+# (below threshold relative to the largest), so only combinations of basis functions that are truly singular are dropped
+def overlap_factor(S,threshold=1e-14):
+    try:
+        L = cholesky(S,lower=True)
+        if np.diag(L).min()**2 > threshold*np.diag(S).max():
+            return {'L': L}
+    except LinAlgError:
+        pass
+    s, U = eigh(S)
+    keep = s > threshold*s[-1]
+    return {'X': U[:,keep]/np.sqrt(s[keep])}
+
+# ascending eigenvalues and S-orthonormal eigenvectors of H c = E S c, given the factor of S from overlap_factor,
+# only the lowest nRoots if nRoots is given.  With the Cholesky factor L^-1 H L^-T and c = L^-T y come from triangular
+# solves, which keep round-off errors far smaller than multiplying by an explicit inverse of L or S^(1/2)
+def generalized_eigh(H,factor,nRoots=None):
+    if 'L' in factor:
+        L = factor['L']
+        A = solve_triangular(L,solve_triangular(L,H,lower=True).T,lower=True)
+    else:
+        A = np.dot(factor['X'].T,np.dot(H,factor['X']))
+    A = 0.5*(A + A.T)
+    if nRoots is None:
+        E, y = eigh(A)
+    else:
+        E, y = eigh(A,subset_by_index=[0,min(nRoots,A.shape[0])-1],driver='evr')
+    if 'L' in factor:
+        return E, solve_triangular(L,y,lower=True,trans='T')
+    return E, np.dot(factor['X'],y)
+
+# Gauss-Legendre nodes and weights on a <= x <= b, computed once for each nQuad, a and b
+legendreCache = {}
+def gauss_legendre(nQuad,a=-1.0,b=1.0):
+    if (nQuad,a,b) not in legendreCache:
+        u, w = np.polynomial.legendre.leggauss(nQuad)
+        legendreCache[(nQuad,a,b)] = (a + 0.5*(b-a)*(u+1), 0.5*(b-a)*w)
+    return legendreCache[(nQuad,a,b)]
+
+# basis function values (or derivatives) at points, shape (len(points),K), evaluated once per grid
+def basis_on_grid(basis,points,derivative=False):
+    points = np.asarray(points,dtype=float)
+    key = (derivative,points.tobytes())
+    if key not in basis['cache']:
+        basis['cache'][key] = basis['derivatives' if derivative else 'values'](points)
+    return basis['cache'][key]
+
+# overlap matrix, analytic if the basis provides it, otherwise B^T W B on the quadrature grid
+def overlap(basis):
+    if 'S' not in basis['cache']:
+        if 'S' in basis:
+            basis['cache']['S'] = basis['S']
+        else:
+            points, w = basis['quadrature']()
+            B = basis_on_grid(basis,points)
+            basis['cache']['S'] = np.dot(B.T*w,B)
+    return basis['cache']['S']
+
+# kinetic energy matrix, analytic or kineticFactor D^T W D from the derivatives on the quadrature grid
+def kinetic(basis):
+    if 'T' not in basis['cache']:
+        if 'T' in basis:
+            basis['cache']['T'] = basis['T']
+        else:
+            points, w = basis['quadrature']()
+            D = basis_on_grid(basis,points,derivative=True)
+            basis['cache']['T'] = basis['kineticFactor']*np.dot(D.T*w,D)
+    return basis['cache']['T']
+
+# potential energy matrix, analytic if the basis has a formula for V, otherwise B^T W V B on the quadrature grid
+def potential_energy(basis,V):
+    if isinstance(V,dict):
+        if 'potential' in basis:
+            VMatrix = basis['potential'](V)
+            if VMatrix is not None:
+                return VMatrix
+        V = V['function']
+    points, w = basis['quadrature']()
+    B = basis_on_grid(basis,points)
+    return np.dot(B.T*(w*V(points)),B)
+
+# variational energies (ascending) of H = T + V in the basis, wavefunctions at points (if given), S and H
+def variational_solution(basis,V=None,points=None,nRoots=None):
+    S = overlap(basis)
+    H = kinetic(basis)
+    if V is not None:
+        H = H + potential_energy(basis,V)
+    if 'factor' not in basis['cache']:
+        basis['cache']['factor'] = overlap_factor(S)
+    E, c = generalized_eigh(H,basis['cache']['factor'],nRoots)
+    # the eigenvectors are S-orthonormal, so the wavefunctions are normalized
+    psi = None if points is None else np.dot(basis_on_grid(basis,points),c)
+    return E, psi, S, H
+
+# variational energies of the bases made of the first n of the functions in order, for every n in sizes (ascending).
+# S and H grow by their border rows only, taken from the analytic matrices or computed from the cached basis values,
+# and so do the Cholesky factor L of S, its inverse and L^-1 H L^-T, the matrix whose eigenvalues solve H c = E S c;
+# once a new pivot shows that S is close to singular, S is factored again at each size by overlap_factor instead
+def basis_sweep(basis,order,sizes,V=None,nRoots=None,threshold=1e-10):
+    order = np.asarray(order)
+    sizes = np.asarray(sizes)
+    # every size adds a border of at least one new row to the previous basis
+    if np.any(np.diff(np.concatenate([[0],sizes])) <= 0) or sizes[-1] > order.size:
+        raise ValueError("basis sizes must increase strictly, from 1 up to at most len(order)")
+    points, w = basis['quadrature']()
+    SMatrix = overlap(basis) if 'S' in basis else None
+    TMatrix = kinetic(basis) if 'T' in basis else None
+    VMatrix = None
+    if isinstance(V,dict) and 'potential' in basis:
+        VMatrix = basis['potential'](V)
+    if V is not None and VMatrix is None:
+        wV = w*(V['function'] if isinstance(V,dict) else V)(points)
+    # rows and cols of an analytic matrix, or weighted products of the cached basis values (or derivatives)
+    def block(matrix,weights,rows,cols,derivative=False):
+        if matrix is not None:
+            return matrix[np.ix_(rows,cols)]
+        B = basis_on_grid(basis,points,derivative)
+        return np.dot(B[:,rows].T*weights,B[:,cols])
+    K = order.size
+    S, H = np.zeros((K,K)), np.zeros((K,K))
+    # Cholesky factor L of S, its inverse M and A = M H M^T, all grown by their border rows
+    L, M, A = np.zeros((K,K)), np.zeros((K,K)), np.zeros((K,K))
+    useCholesky = True
+    energies = []
+    n = 0
+    for size in sizes:
+        rows, cols = order[n:size], order[:size]
+        S[n:size,:size] = block(SMatrix,w,rows,cols)
+        H[n:size,:size] = block(TMatrix,w,rows,cols) if TMatrix is not None else basis['kineticFactor']*block(None,w,rows,cols,True)
+        if V is not None:
+            H[n:size,:size] += block(VMatrix,w,rows,cols) if VMatrix is not None else block(None,wV,rows,cols)
+        S[:n,n:size] = S[n:size,:n].T
+        H[:n,n:size] = H[n:size,:n].T
+        if useCholesky:
+            # L21 L11^T = S21 and L22 L22^T = S22 - L21 L21^T, then M21 = -L22^-1 L21 M11 and M22 = L22^-1
+            L[n:size,:n] = solve_triangular(L[:n,:n],S[n:size,:n].T,lower=True).T
+            try:
+                L[n:size,n:size] = cholesky(S[n:size,n:size] - np.dot(L[n:size,:n],L[n:size,:n].T),lower=True)
+                useCholesky = np.diag(L[n:size,n:size]).min()**2 > threshold*np.diag(S[:size,:size]).max()
+            except LinAlgError:
+                useCholesky = False
+        if useCholesky:
+            M[n:size,n:size] = solve_triangular(L[n:size,n:size],np.eye(size-n),lower=True)
+            M[n:size,:n] = -np.dot(M[n:size,n:size],np.dot(L[n:size,:n],M[:n,:n]))
+            A[n:size,:size] = np.dot(M[n:size,:size],np.dot(H[:size,:size],M[:size,:size].T))
+            A[:n,n:size] = A[n:size,:n].T
+            if nRoots is None:
+                E = eigh(A[:size,:size],eigvals_only=True)
+            else:
+                E = eigh(A[:size,:size],eigvals_only=True,subset_by_index=[0,min(nRoots,size)-1],driver='evr')
+        else:
+            E = generalized_eigh(H[:size,:size],overlap_factor(S[:size,:size]),nRoots)[0]
+        energies.append(E)
+        n = size
+    return energies
+
+# coupled oscillators in the tensor product of 1-D bases (one for each coordinate), with the Hamiltonian kept as a sum of
+# products of 1-D matrices and applied to vectors one coordinate at a time
+
+# matrix of d/dx, int g_i dg_j/dx, from the cached basis values and derivatives on the quadrature grid
+def derivative_matrix(basis):
+    points, w = basis['quadrature']()
+    return np.dot(basis_on_grid(basis,points).T*w,basis_on_grid(basis,points,derivative=True))
+
+# sum over terms [A_1,...,A_d] of the products A_1 x A_2 x ... x A_d (None for the identity) times the vector v, seen as a
+# tensor of the given shape; each factor is one 1-D matrix product along its axis, so no product matrix is formed
+def apply_product_operator(terms,v,shape):
+    v = np.reshape(v,shape)
+    result = 0.0
+    for term in terms:
+        w = v
+        for k, A in enumerate(term):
+            if A is not None:
+                w = np.moveaxis(np.tensordot(A,w,axes=(1,k)),0,k)
+        result = result + w
+    return np.ravel(result)
+
+# lowest nStates energies and coefficients, shape (K_1,...,K_d,nStates), of H = sum_k (T_k + V_k(x_k)) plus coupling
+# terms, each a list of one factor per coordinate (a potential, a matrix such as derivative_matrix, or None).
+# Every coordinate is first solved on its own and only its nKeep lowest states are kept (all for nKeep=None), so the
+# uncoupled part of H is diagonal and the very high energies of the full basis, which slow Lanczos down or keep it from
+# converging at all, are left out.  This contracted basis is an approximation on top of the product basis: check the
+# energies against a larger nKeep.  The coupled problem is solved by Lanczos, with H applied by apply_product_operator
+def product_solution(bases,potentials,couplings=None,nStates=6,nKeep=20):
+    couplings = [] if couplings is None else couplings
+    d = len(bases)
+    energies1D, vectors1D = [], []
+    for basis, V in zip(bases,potentials):
+        if 'factor' not in basis['cache']:
+            basis['cache']['factor'] = overlap_factor(overlap(basis))
+        E, c = generalized_eigh(kinetic(basis) + potential_energy(basis,V),basis['cache']['factor'],nKeep)
+        energies1D.append(E)
+        vectors1D.append(c)
+    shape = tuple(E.size for E in energies1D)
+    # zeroth order energies E_1 + E_2 + ... on the diagonal
+    diagonal = np.zeros(shape)
+    for k, E in enumerate(energies1D):
+        diagonal += np.reshape(E,[-1 if j == k else 1 for j in range(d)])
+    diagonal = np.ravel(diagonal)
+    # coupling terms in the 1-D eigenstates
+    terms = []
+    for coupling in couplings:
+        term = []
+        for basis, c, A in zip(bases,vectors1D,coupling):
+            if A is not None and not isinstance(A,np.ndarray):
+                A = potential_energy(basis,A)
+            term.append(None if A is None else np.dot(c.T,np.dot(A,c)))
+        terms.append(term)
+    def matvec(v):
+        v = np.ravel(v)
+        return diagonal*v + apply_product_operator(terms,v,shape)
+    H = LinearOperator((diagonal.size,diagonal.size),matvec=matvec,dtype=float)
+    E, y = eigsh(H,k=nStates,which='SA')
+    idx = np.argsort(E)
+    # back to the coefficients of the original basis functions
+    coefficients = np.stack([np.reshape(apply_product_operator([vectors1D],y[:,i],shape),[c.shape[0] for c in vectors1D])
+                             for i in idx],axis=-1)
+    return E[idx], coefficients
+
+# least squares coefficients of the first nFunctions basis functions (default all) fitted to data y at points x
+def least_squares_fit(basis,x,y,nFunctions=None):
+    A = basis_on_grid(basis,x)[:,:nFunctions]
+    return np.linalg.lstsq(A,y,rcond=None)[0]
+
+# polynomial sum_n c_n x^n and Morse De (1-exp(-beta x))^2 potentials, with analytic gaussian matrix elements
+def polynomial_potential(coefficients):
+    return {'polynomial': list(coefficients), 'function': lambda x: np.polynomial.polynomial.polyval(x,coefficients)}
+
+def morse_potential(De,beta):
+    return {'morse': (De,beta), 'function': lambda x: De*(1-np.exp(-beta*x))**2}
+
+# gaussians exp(-alpha (x-x_i)^2) centered at x0, with analytic S, T (Ostlund and Szabo page 47) and polynomial or
+# Morse potential matrix elements, and Gauss-Legendre quadrature over the range where the gaussians are non-zero
+def gaussian_basis(x0,alpha,nQuad=None):
+    x0 = np.asarray(x0,dtype=float)
+    diff = x0[:,None] - x0[None,:]
+    S = np.sqrt(0.5*np.pi/alpha)*np.exp(-0.5*alpha*diff**2)
+    # g_i g_j is S_ij times a normalized gaussian centered at X with variance var
+    X = 0.5*(x0[:,None] + x0[None,:])
+    var = 0.25/alpha
+    def values(x):
+        return np.exp(-alpha*(x[:,None]-x0)**2)
+    def derivatives(x):
+        return -2*alpha*(x[:,None]-x0)*values(x)
+    def potential(V):
+        if 'polynomial' in V:
+            # gaussian averages of x^n from <x^(n+1)> = X <x^n> + n var <x^(n-1)>
+            average = np.zeros_like(X)
+            previous, moment = np.zeros_like(X), np.ones_like(X)
+            for n, c in enumerate(V['polynomial']):
+                average += c*moment
+                previous, moment = moment, X*moment + n*var*previous
+            return S*average
+        if 'morse' in V:
+            De, beta = V['morse']
+            # <exp(-g x)> = exp(-g X + g^2 var/2)
+            return De*S*(1 - 2*np.exp(-beta*X + 0.5*beta**2*var) + np.exp(-2*beta*X + 2*beta**2*var))
+        return None
+    width = 8.0/np.sqrt(alpha)
+    a, b = x0.min() - width, x0.max() + width
+    if nQuad is None:
+        # about eight nodes per gaussian width
+        nQuad = int(8*(b-a)*np.sqrt(alpha)) + 40
+    def quadrature():
+        return gauss_legendre(nQuad,a,b)
+    return {'values': values, 'derivatives': derivatives, 'quadrature': quadrature, 'kineticFactor': 0.5,
+            'S': S, 'T': 0.5*S*(alpha - alpha**2*diff**2), 'potential': potential, 'cache': {}}
+
+# normalized functions f(theta,i), i = 0,...,N-1, on 0 <= theta <= pi with volume element sin(theta) dtheta, and their
+# theta derivatives; the quadrature is Gauss-Legendre in x = cos(theta) or, for functions that are smooth in theta but
+# not in cos(theta), in theta itself
+def angular_basis(basis_function,basis_derivative,N,nQuad=None,quadrature='cos',kineticFactor=1.0):
+    i = np.arange(N)
+    if nQuad is None:
+        nQuad = 2*N + 20
+    if quadrature == 'cos':
+        x, w = gauss_legendre(nQuad)
+        theta = np.arccos(x)
+    else:
+        theta, w = gauss_legendre(nQuad,0.0,np.pi)
+        w = w*np.sin(theta)
+    norm = np.sqrt(np.dot(w,basis_function(theta[:,None],i)**2))
+    def values(theta):
+        return basis_function(theta[:,None],i)/norm
+    def derivatives(theta):
+        return basis_derivative(theta[:,None],i)/norm
+    def nodes():
+        return theta, w
+    return {'values': values, 'derivatives': derivatives, 'quadrature': nodes, 'kineticFactor': kineticFactor, 'cache': {}}